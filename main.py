@@ -1,11 +1,106 @@
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, timedelta
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import math
 import os
-from pyproj import Transformer
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 
 api_key = os.getenv("NOAA_API_KEY")
 
+# Modelos magnéticos disponíveis na API do NOAA
+MODELS = ["IGRF", "WMM"]
+
+# Endpoint do NOAA e parâmetros fixos de todas as consultas
+_NOAA_URL = "https://www.ngdc.noaa.gov/geomag-web/calculators/calculateIgrfwmm"
+_NOAA_BASE = {
+    "elevation": 0,
+    "elevationUnits": "K",
+    "coordinateSystem": "D",
+    "key": api_key,
+    "resultFormat": "json",
+}
+
+# Colunas esperadas no arquivo CSV de coordenadas
+CSV_COLUMNS = [
+    "lat_graus",
+    "lat_minutos",
+    "lat_segundos",
+    "lat_direcao",
+    "lon_graus",
+    "lon_minutos",
+    "lon_segundos",
+    "lon_direcao",
+]
+
+# Colunas da tabela de resultados (campo do NOAA -> título) e sua formatação na tela
+RESULTS_COLUMNS = {
+    "date": "Data (ano decimal)",
+    "declination": "Declinação",
+    "inclination": "Inclinação",
+    "totalintensity": "Intensidade Total",
+}
+RESULTS_COLUMN_CONFIG = {
+    "Data (ano decimal)": st.column_config.NumberColumn(format="%.2f"),
+    "Declinação": st.column_config.NumberColumn(format="%.2f°"),
+    "Inclinação": st.column_config.NumberColumn(format="%.2f°"),
+    "Intensidade Total": st.column_config.NumberColumn(format="%.2f nT"),
+}
+
+# Valores máximos das colunas numéricas do CSV (os mínimos são 0)
+CSV_LIMITS = {
+    "lat_graus": 90,
+    "lat_minutos": 59,
+    "lat_segundos": 59.9999,
+    "lon_graus": 180,
+    "lon_minutos": 59,
+    "lon_segundos": 59.9999,
+}
+
+# Conversão UTM: "pyproj" (pipeline completo do PROJ, padrão) ou "kruger" (fórmula fechada, opcional)
+UTM_BACKENDS = ["pyproj", "kruger"]
+UTM_BACKEND = os.getenv("UTM_BACKEND", "pyproj").strip().lower()
+if UTM_BACKEND not in UTM_BACKENDS:
+    raise ValueError(f"UTM_BACKEND inválido: {UTM_BACKEND!r}. Use um de {UTM_BACKENDS}.")
+
+# Elipsoide GRS80 (SIRGAS2000) e constantes da projeção UTM
+_GRS80_A = 6378137.0
+_GRS80_F = 1 / 298.257222101
+_UTM_K0 = 0.9996
+_UTM_FALSE_EASTING = 500000.0
+_UTM_FALSE_NORTHING_SOUTH = 10000000.0
+
+# Códigos EPSG SIRGAS2000 / UTM das zonas válidas para o Brasil (31978 = Zona 18S)
+_ZONE_EPSG = {zone: 31978 + (zone - 18) for zone in range(18, 26)}
+
+# Cache persistente (SQLite) das respostas do NOAA, compartilhado entre usuários e reinícios.
+# O campo geomagnético varia em escala de anos, então 30 dias de validade é bem conservador.
+NOAA_CACHE_PATH = os.getenv("NOAA_CACHE_PATH", "/var/tmp/noaa_cache")
+_NOAA_CACHE_EXPIRATION = timedelta(days=30)
+
+# Tamanho do pool de conexões HTTP e de threads em get_magnetic_fields. Acertos de cache
+# respondem direto; só as chamadas de rede ficam sujeitas a _NOAA_MAX_CONCURRENT.
+_POOL_MAXSIZE = 8
+
+# Limite de requisições simultâneas ao NOAA no processo, somando todos os usuários
+_NOAA_MAX_CONCURRENT = 5
+
+
+class _LimitedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter que limita as chamadas de rede com um semáforo; respostas do cache em disco não chegam até aqui."""
+
+    def __init__(self, semaphore, **kwargs):
+        self._sem = semaphore
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        with self._sem:
+            return super().send(request, **kwargs)
+
 
 def dms_to_decimal(degrees, minutes, seconds):
     """Converte coordenadas de Graus, Minutos, Segundos para decimal."""
@@ -19,52 +114,258 @@ def format_lat_lon(lat, lon):
     return f"{abs(lat):.6f}° {lat_dir}", f"{abs(lon):.6f}° {lon_dir}"
 
 
+def dms_to_decimal_arr(degrees, minutes, seconds):
+    """Versão vetorizada de dms_to_decimal para arrays NumPy."""
+    # Importações tardias: NumPy/pandas só são carregados nos modos de lote (CSV e intervalo de datas)
+    import numpy as np
+
+    degrees, minutes, seconds = (np.asarray(v, dtype=float) for v in (degrees, minutes, seconds))
+    return degrees + minutes * (1 / 60.0) + seconds * (1 / 3600.0)
+
+
+def format_lat_lon_arr(lat, lon):
+    """Versão vetorizada de format_lat_lon para arrays NumPy."""
+    import numpy as np
+
+    lat, lon = np.asarray(lat), np.asarray(lon)
+    formatted_lat = np.char.add(np.char.mod("%.6f° ", np.abs(lat)), np.where(lat >= 0, "N", "S"))
+    formatted_lon = np.char.add(np.char.mod("%.6f° ", np.abs(lon)), np.where(lon >= 0, "E", "W"))
+    return formatted_lat, formatted_lon
+
+
+def format_results_table(results):
+    """Monta a tabela de resultados do NOAA (uma linha por resultado), com colunas numéricas.
+
+    A formatação fica a cargo de RESULTS_COLUMN_CONFIG, para que a ordenação continue numérica.
+    """
+    import pandas as pd
+
+    return pd.DataFrame(results)[list(RESULTS_COLUMNS)].rename(columns=RESULTS_COLUMNS).astype(float)
+
+
+def read_coordinates_csv(file):
+    """Lê um CSV com coordenadas em graus, minutos e segundos e retorna arrays (lat, lon) decimais.
+
+    Levanta ValueError para arquivo sem linhas, células em branco, valores não numéricos ou fora
+    dos limites e direções inválidas.
+    """
+    import numpy as np
+    import pandas as pd
+
+    df = pd.read_csv(file)[CSV_COLUMNS]
+    if df.empty:
+        raise ValueError("arquivo sem linhas")
+
+    blank_rows = df.index[df.isna().any(axis=1)]
+    if len(blank_rows):
+        raise ValueError(f"células em branco na(s) linha(s) {', '.join(str(i + 2) for i in blank_rows)}")
+
+    dms = {column: pd.to_numeric(df[column], errors="raise") for column in CSV_COLUMNS if "direcao" not in column}
+    lat_dir = df["lat_direcao"].astype(str).str.strip().str.upper()
+    lon_dir = df["lon_direcao"].astype(str).str.strip().str.upper()
+    if not (lat_dir.isin(["N", "S"]).all() and lon_dir.isin(["E", "W"]).all()):
+        raise ValueError("as direções devem ser N/S para latitude e E/W para longitude")
+
+    # Mesmos limites das entradas manuais; o sinal vem apenas da direção
+    for column, upper in CSV_LIMITS.items():
+        out_of_range = ~dms[column].between(0, upper)
+        if out_of_range.any():
+            rows = ", ".join(str(i + 2) for i in dms[column].index[out_of_range])
+            raise ValueError(f"{column} fora do intervalo de 0 a {upper} na(s) linha(s) {rows}")
+
+    lat = dms_to_decimal_arr(dms["lat_graus"], dms["lat_minutos"], dms["lat_segundos"])
+    lon = dms_to_decimal_arr(dms["lon_graus"], dms["lon_minutos"], dms["lon_segundos"])
+    lat = np.where(lat_dir == "S", -lat, lat)
+    lon = np.where(lon_dir == "W", -lon, lon)
+    return lat, lon
+
+
 def get_epsg(zone):
     """Retorna o código EPSG correspondente à zona no hemisfério sul no SIRGAS2000."""
-    base_epsg = 31978  # EPSG base para o hemisfério sul (Zona 18S)
-    if 18 <= zone <= 25:  # Zonas válidas para o Brasil
-        return base_epsg + (zone - 18)
-    else:
-        raise ValueError("Zona inválida. Escolha uma zona entre 18 e 25 no hemisfério sul.")
+    try:
+        return _ZONE_EPSG[zone]
+    except KeyError:
+        raise ValueError("Zona inválida. Escolha uma zona entre 18 e 25 no hemisfério sul.") from None
 
 
+@st.cache_resource(show_spinner=False)
+def _http_session():
+    """Sessão HTTP única por processo: reaproveita conexões TCP/TLS com o NOAA entre execuções.
+
+    As respostas ficam em cache no disco (a chave de acesso não é gravada); se NOAA_CACHE_PATH não
+    puder ser aberto, usa uma sessão sem cache em disco. Respostas comprimidas: o requests já
+    anuncia gzip/deflate, e br quando o pacote brotli está instalado.
+    """
+    # Importação tardia: só quem clica em "Calcular" paga o custo do requests_cache
+    import requests_cache
+
+    try:
+        session = requests_cache.CachedSession(
+            NOAA_CACHE_PATH,
+            backend="sqlite",
+            expire_after=_NOAA_CACHE_EXPIRATION,
+            ignored_parameters=["key"],
+        )
+    except (sqlite3.Error, OSError):
+        session = requests.Session()
+    session.mount(
+        "https://",
+        # O semáforo nasce com a sessão em cache, e não a cada execução do script
+        _LimitedHTTPAdapter(
+            threading.BoundedSemaphore(_NOAA_MAX_CONCURRENT),
+            pool_connections=4,
+            pool_maxsize=_POOL_MAXSIZE,
+            max_retries=Retry(total=2, backoff_factor=0.3),
+        ),
+    )
+    return session
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _get_transformer(epsg_code):
+    """Retorna (e reutiliza) o Transformer do EPSG informado para SIRGAS2000 geográfico."""
+    # Importação tardia: o pyproj (e o banco do PROJ) só é carregado se esse caminho for usado
+    from pyproj import Transformer
+
+    return Transformer.from_crs(f"EPSG:{epsg_code}", "EPSG:4674", always_xy=True)  # EPSG:4674 é SIRGAS2000 geográfico
+
+
+def _utm_inverse_grs80(easting, northing, central_meridian, south=True):
+    """Inversa da projeção UTM no GRS80 pela série de Krüger (precisão submilimétrica na zona).
+
+    Retorna (lat, lon) em graus decimais, sem passar pelo PROJ.
+    """
+    n = _GRS80_F / (2 - _GRS80_F)
+    n2, n3 = n * n, n * n * n
+    # Raio retificante
+    rect_radius = _GRS80_A / (1 + n) * (1 + n2 / 4 + n2 * n2 / 64)
+    beta = (n / 2 - 2 * n2 / 3 + 37 * n3 / 96, n2 / 48 + n3 / 15, 17 * n3 / 480)
+    delta = (2 * n - 2 * n2 / 3 - 2 * n3, 7 * n2 / 3 - 8 * n3 / 5, 56 * n3 / 15)
+
+    if south:
+        northing = northing - _UTM_FALSE_NORTHING_SOUTH
+    xi = northing / (_UTM_K0 * rect_radius)
+    eta = (easting - _UTM_FALSE_EASTING) / (_UTM_K0 * rect_radius)
+
+    xi_p, eta_p = xi, eta
+    for j, b in enumerate(beta, start=1):
+        xi_p -= b * math.sin(2 * j * xi) * math.cosh(2 * j * eta)
+        eta_p -= b * math.cos(2 * j * xi) * math.sinh(2 * j * eta)
+
+    # Latitude conforme e, a partir dela, a latitude geodésica
+    chi = math.asin(math.sin(xi_p) / math.cosh(eta_p))
+    lat = chi + sum(d * math.sin(2 * j * chi) for j, d in enumerate(delta, start=1))
+    lon = math.radians(central_meridian) + math.atan2(math.sinh(eta_p), math.cos(xi_p))
+    return math.degrees(lat), math.degrees(lon)
+
+
+@st.cache_data(max_entries=128, show_spinner=False)
 def utm_to_latlon(northing, easting, zone):
     """Converte coordenadas UTM para Latitude/Longitude no SIRGAS2000."""
-    epsg_code = get_epsg(zone)
-    transformer = Transformer.from_crs(f"EPSG:{epsg_code}", "EPSG:4674", always_xy=True)  # EPSG:4674 é SIRGAS2000 geográfico
-    lon, lat = transformer.transform(easting, northing)
-    return lat, lon
+    epsg_code = get_epsg(zone)  # Também valida a zona
+    if UTM_BACKEND == "pyproj":
+        lon, lat = _get_transformer(epsg_code).transform(easting, northing)
+        return lat, lon
+    return _utm_inverse_grs80(easting, northing, 6 * zone - 183, south=True)
 
 
-def get_magnetic_field(lat, lon, date):
-    """Obtém os dados do campo magnético da API do NOAA."""
-    url = "https://www.ngdc.noaa.gov/geomag-web/calculators/calculateIgrfwmm"
+@st.cache_data(ttl=86400, show_spinner=False)
+def _fetch_magnetic_field(lat, lon, start_iso, end_iso, date_step, model):
+    """Consulta a API do NOAA; erros são propagados para não serem armazenados em cache."""
+    start_date = datetime.fromisoformat(start_iso)
+    end_date = datetime.fromisoformat(end_iso)
 
-    params = {
+    # Um intervalo de datas é resolvido pela API em uma única requisição
+    params = _NOAA_BASE | {
         "lat1": lat,
         "lon1": lon,
-        "elevation": 0,
-        "coordinateSystem": "D",
-        "model": "IGRF",
-        "startYear": date.year,
-        "startMonth": date.month,
-        "startDay": date.day,
-        "key": api_key,
-        "resultFormat": "json",
+        "model": model,
+        "startYear": start_date.year,
+        "startMonth": start_date.month,
+        "startDay": start_date.day,
+        "endYear": end_date.year,
+        "endMonth": end_date.month,
+        "endDay": end_date.day,
+        "dateStepSize": date_step,  # Passo entre datas, em anos
     }
 
+    response = _http_session().get(_NOAA_URL, params=params, timeout=(3, 10))
+    response.raise_for_status()
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError as e:
+        # Mesmo tipo de erro de response.json(), já tratado por quem chama
+        raise requests.exceptions.JSONDecodeError(e.msg, e.doc, e.pos, response=response) from e
+
+
+def _report_request_error(e):
+    """Exibe o erro de uma requisição ao NOAA, incluindo a resposta da API quando houver."""
+    st.error(f"Erro ao obter dados do NOAA: {e}")
+    if e.response is not None:
+        st.error(f"Detalhes da resposta: {e.response.text}")
+
+
+def _valid_coordinates(lat, lon):
+    """Verifica se latitude e longitude existem e estão dentro dos limites, antes de consultar o NOAA."""
+    if lat is None or lon is None or not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+        st.error(f"Coordenadas inválidas: latitude {lat}, longitude {lon}.")
+        return False
+    return True
+
+
+def get_magnetic_field(lat, lon, start_date, end_date=None, date_step=1.0, model="IGRF"):
+    """Obtém os dados do campo magnético da API do NOAA para uma data ou um intervalo de datas."""
+    if not _valid_coordinates(lat, lon):
+        return None
+
+    end_date = end_date or start_date
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
+        # Arredondar (~10 m) para que coordenadas próximas reutilizem o cache
+        return _fetch_magnetic_field(
+            round(lat, 4), round(lon, 4), start_date.isoformat(), end_date.isoformat(), date_step, model
+        )
     except requests.exceptions.RequestException as e:
-        st.error(f"Erro ao obter dados do NOAA: {e}")
+        _report_request_error(e)
         return None
 
 
+def get_magnetic_fields(coords, start_date, end_date=None, date_step=1.0, model="IGRF"):
+    """Obtém os dados do campo magnético para vários pontos (lat, lon) em paralelo.
+
+    O tempo total fica próximo ao da requisição mais lenta, e não à soma de todas.
+    """
+    start_iso = start_date.isoformat()
+    end_iso = (end_date or start_date).isoformat()
+    with ThreadPoolExecutor(max_workers=_POOL_MAXSIZE) as executor:
+        # Pontos inválidos não chegam a gerar requisição
+        futures = [
+            executor.submit(_fetch_magnetic_field, round(lat, 4), round(lon, 4), start_iso, end_iso, date_step, model)
+            if _valid_coordinates(lat, lon)
+            else None
+            for lat, lon in coords
+        ]
+
+    # Os erros são exibidos na thread principal, onde o contexto do Streamlit está disponível
+    results = []
+    for future in futures:
+        if future is None:
+            results.append(None)
+            continue
+        try:
+            results.append(future.result())
+        except requests.exceptions.RequestException as e:
+            _report_request_error(e)
+            results.append(None)
+    return results
+
+
 def main():
     st.set_page_config(page_title="Calculadora de Campo Magnético", layout="wide")
-    st.title("Calculadora de Campo Magnético (IGRF)")
+    model = st.sidebar.selectbox("Modelo magnético", MODELS, index=0)
+    st.title(f"Calculadora de Campo Magnético ({model})")
+
+    if not api_key:
+        st.error("Chave da API do NOAA não configurada. Defina a variável de ambiente NOAA_API_KEY.")
 
     # Avisos importantes
     st.warning(
@@ -78,9 +379,12 @@ def main():
 
     # Escolha do tipo de entrada
     st.subheader("Escolha o Tipo de Entrada")
-    input_type = st.radio("Tipo de coordenadas para entrada:", ["Latitude/Longitude", "Northing/Easting"], index=0)
+    input_type = st.radio(
+        "Tipo de coordenadas para entrada:", ["Latitude/Longitude", "Northing/Easting", "Arquivo CSV"], index=0
+    )
 
     lat_decimal, lon_decimal = None, None
+    batch_lat, batch_lon = None, None
 
     if input_type == "Latitude/Longitude":
         # Entrada de Latitude/Longitude
@@ -118,23 +422,44 @@ def main():
     elif input_type == "Northing/Easting":
         # Entrada de Northing/Easting
         st.subheader("Coordenadas UTM")
-        col1, col2, col3 = st.columns([2, 2, 2])
-        with col1:
-            northing = st.number_input("Northing (metros)", min_value=0.0, value=7460122.0, step=0.1, key="northing")
-        with col2:
-            easting = st.number_input("Easting (metros)", min_value=0.0, value=234567.0, step=0.1, key="easting")
-        with col3:
-            zone = st.number_input("Zona UTM (18 a 25)", min_value=18, max_value=25, value=23, step=1, key="zone")
+        # O formulário só dispara uma nova execução ao clicar em "Converter", e não a cada alteração
+        with st.form("utm_form"):
+            col1, col2, col3 = st.columns([2, 2, 2])
+            with col1:
+                northing = st.number_input("Northing (metros)", min_value=0.0, value=7460122.0, step=0.1, key="northing")
+            with col2:
+                easting = st.number_input("Easting (metros)", min_value=0.0, value=234567.0, step=0.1, key="easting")
+            with col3:
+                zone = st.number_input("Zona UTM (18 a 25)", min_value=18, max_value=25, value=23, step=1, key="zone")
+            st.form_submit_button("Converter")
 
-        # Converter UTM para Latitude/Longitude em tempo real
+        # Converter UTM para Latitude/Longitude com os últimos valores enviados
         try:
             lat_decimal, lon_decimal = utm_to_latlon(northing, easting, zone)
         except ValueError as e:
             st.error(str(e))
 
+    elif input_type == "Arquivo CSV":
+        # Entrada de vários pontos a partir de um arquivo
+        st.subheader("Arquivo de Coordenadas")
+        st.caption(f"Colunas esperadas: {', '.join(CSV_COLUMNS)} (direções N/S e E/W).")
+        uploaded_file = st.file_uploader("CSV", type="csv")
+        if uploaded_file is not None:
+            try:
+                batch_lat, batch_lon = read_coordinates_csv(uploaded_file)
+            except (KeyError, ValueError) as e:
+                st.error(f"Arquivo CSV inválido: {e}")
+
     # Data
     st.subheader("Data")
     data = st.date_input("Selecione a data", datetime.now())
+    data_final, passo = None, 1.0
+    if st.checkbox("Calcular para um intervalo de datas"):
+        col1, col2 = st.columns([2, 2])
+        with col1:
+            data_final = st.date_input("Data final", data, min_value=data)
+        with col2:
+            passo = st.number_input("Passo (anos)", min_value=0.1, value=1.0, step=0.1, format="%.1f")
 
     # Mostrar coordenadas decimais formatadas
     if lat_decimal is not None and lon_decimal is not None:
@@ -142,17 +467,45 @@ def main():
         st.write(f"Latitude: {formatted_lat}")
         st.write(f"Longitude: {formatted_lon}")
 
+    if batch_lat is not None:
+        import pandas as pd
+
+        formatted_lat, formatted_lon = format_lat_lon_arr(batch_lat, batch_lon)
+        st.dataframe(pd.DataFrame({"Latitude": formatted_lat, "Longitude": formatted_lon}))
+
     # Botão para calcular o campo magnético
-    if st.button("Calcular Campo Magnético"):
+    no_coordinates = lat_decimal is None and batch_lat is None
+    if st.button("Calcular Campo Magnético", disabled=not api_key or no_coordinates):
         with st.spinner("Calculando..."):
-            results = get_magnetic_field(lat_decimal, lon_decimal, data)
-
-            if results and "result" in results:
-                result_data = results["result"][0]
-                st.success("Resultados do Campo Magnético:")
-                st.metric("Declinação", f"{result_data['declination']:.2f}°")
-                st.metric("Inclinação", f"{result_data['inclination']:.2f}°")
-                st.metric("Intensidade Total", f"{result_data['totalintensity']:.2f} nT")
+            if batch_lat is not None:
+                coords = zip(batch_lat.tolist(), batch_lon.tolist())
+                batch_results = get_magnetic_fields(coords, data, data_final, passo, model)
+
+                row_lat, row_lon, rows = [], [], []
+                for lat, lon, results in zip(formatted_lat, formatted_lon, batch_results):
+                    for result_data in (results or {}).get("result", []):
+                        row_lat.append(lat)
+                        row_lon.append(lon)
+                        rows.append(result_data)
+                if rows:
+                    table = format_results_table(rows)
+                    table.insert(0, "Latitude", row_lat)
+                    table.insert(1, "Longitude", row_lon)
+                    st.success("Resultados do Campo Magnético:")
+                    st.dataframe(table, column_config=RESULTS_COLUMN_CONFIG)
+            else:
+                results = get_magnetic_field(lat_decimal, lon_decimal, data, data_final, passo, model)
+
+                if results and "result" in results:
+                    st.success("Resultados do Campo Magnético:")
+                    if len(results["result"]) > 1:
+                        # Um intervalo de datas vira uma única tabela, em vez de um st.metric por valor
+                        st.dataframe(format_results_table(results["result"]), column_config=RESULTS_COLUMN_CONFIG)
+                    else:
+                        result_data = results["result"][0]
+                        st.metric("Declinação", f"{result_data['declination']:.2f}°")
+                        st.metric("Inclinação", f"{result_data['inclination']:.2f}°")
+                        st.metric("Intensidade Total", f"{result_data['totalintensity']:.2f} nT")
 
 
 if __name__ == "__main__":